@@ -12,5 +12,5 @@ print(f"Flattened Qubits: {len(flat_qc.qubits)}")
 
 print("Building Graph...")
 G = build_interaction_graph(qc)
-print(f"Graph Nodes: {len(G.nodes())}")
-print(f"Graph Node List: {list(G.nodes())}")
+print(f"Graph Nodes: {G.num_nodes()}")
+print(f"Graph Node List: {list(G.node_indices())}")
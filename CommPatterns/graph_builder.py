@@ -1,31 +1,46 @@
+import collections
 import networkx as nx
-from qiskit import QuantumCircuit
+import rustworkx as rx
+from qiskit import QuantumCircuit, transpile
 from qiskit.dagcircuit import DAGCircuit
 from qiskit.converters import circuit_to_dag
 
+# Standard gates we want to keep. 
+# Note: SWAP and CSWAP are REMOVED to force decomposition into CXs.
+STANDARD_GATES = {'u1', 'u2', 'u3', 'u', 'p', 'i', 'id', 'x', 'y', 'z', 'h', 's', 'sdg', 't', 'tdg', 
+                  'rx', 'ry', 'rz', 'cx', 'cy', 'cz', 'ch', 'ccx', 
+                  'measure', 'barrier', 'reset', 'snapshot', 'delay'}
+
+# Kept as-is by transpile() but rejected in its basis_gates list ('i' is an alias of 'id').
+NON_BASIS_OPS = {'i', 'measure', 'barrier', 'reset', 'snapshot', 'delay'}
+
+# Node payloads. rustworkx stores any Python object, and a namedtuple is much smaller
+# than a per-node dict; to_networkx() expands them back into attribute dicts.
+GateNode = collections.namedtuple('GateNode', ['name', 'qubits', 'layer', 'avg_qubit'])
+QubitNode = collections.namedtuple('QubitNode', ['label', 'qubit_index', 'op_name', 'layer', 'type'])
+
 def flatten_circuit(circuit: QuantumCircuit) -> QuantumCircuit:
     """
-    Flattens the circuit by repeatedly decomposing custom gates and functions.
+    Flattens the circuit by unrolling custom gates and functions in a single transpile pass.
     Ensures that only standard basis gates remain.
     SWAP and CSWAP are excluded from standard gates to force decomposition into CX/CCX.
     """
-    # Standard gates we want to keep. 
-    # Note: SWAP and CSWAP are REMOVED to force decomposition into CXs.
-    standard_gates = {'u1', 'u2', 'u3', 'u', 'p', 'i', 'id', 'x', 'y', 'z', 'h', 's', 'sdg', 't', 'tdg', 
-                      'rx', 'ry', 'rz', 'cx', 'cy', 'cz', 'ch', 'ccx', 
-                      'measure', 'barrier', 'reset', 'snapshot', 'delay'}
+    # Fast path: already flat (the common case), skip transpile entirely
+    if set(circuit.count_ops()) <= STANDARD_GATES:
+        return circuit
+    
+    try:
+        return transpile(circuit, basis_gates=sorted(STANDARD_GATES - NON_BASIS_OPS), optimization_level=0)
+    except Exception:
+        # Fall back to repeated decomposition if the basis translation fails
+        pass
     
     max_passes = 10
     current_circuit = circuit
     
     for _ in range(max_passes):
-        has_custom = False
-        for inst in current_circuit.data:
-            if inst.operation.name not in standard_gates:
-                has_custom = True
-                break
-        
-        if has_custom:
+        # Same count_ops check as the fast path instead of scanning .data in Python
+        if not set(current_circuit.count_ops()) <= STANDARD_GATES:
             try:
                 current_circuit = current_circuit.decompose()
             except Exception:
@@ -35,57 +50,60 @@ def flatten_circuit(circuit: QuantumCircuit) -> QuantumCircuit:
             
     return current_circuit
 
-def build_graph_from_circuit(circuit: QuantumCircuit) -> nx.MultiDiGraph:
+def build_graph_from_circuit(circuit: QuantumCircuit) -> rx.PyDiGraph:
     """
-    Constructs a NetworkX MultiDiGraph from a Qiskit QuantumCircuit.
+    Constructs a rustworkx multi-edge PyDiGraph from a Qiskit QuantumCircuit.
     Nodes are operations. Edges represent qubit dependencies (dataflow).
+    Node payloads are GateNode tuples, edge payloads are dicts.
     """
     circuit = flatten_circuit(circuit)
     dag = circuit_to_dag(circuit)
-    G = nx.MultiDiGraph()
+    G = rx.PyDiGraph(multigraph=True)
+    
+    # Global integer index per qubit, so the per-qubit trackers can be flat lists
+    q_map = {q: i for i, q in enumerate(circuit.qubits)}
+    last_node_on_qubit = [-1] * len(circuit.qubits)
+    qubit_depths = [0] * len(circuit.qubits)
     
-    last_node_on_qubit = {q: -1 for q in circuit.qubits} 
-    current_id = 0
-    qubit_depths = {q: 0 for q in circuit.qubits}
+    add_node = G.add_node
+    add_edge = G.add_edge
 
     for node in dag.topological_op_nodes():
-        # Determine layer
+        qargs = node.qargs
+        q_indices = [q._index for q in qargs]
+        g_indices = [q_map[q] for q in qargs]
+        
+        # Determine layer (qubit wires only; classical bits do not delay a gate)
         current_layer = 1
-        if node.qargs:
-            current_layer = max(qubit_depths[q] for q in node.qargs) + 1
+        if g_indices:
+            current_layer = max(qubit_depths[g_idx] for g_idx in g_indices) + 1
         
         # Determine average qubit index
-        if node.qargs:
-            avg_qubit = sum(q._index for q in node.qargs) / len(node.qargs)
+        if q_indices:
+            avg_qubit = sum(q_indices) / len(q_indices)
         else:
             avg_qubit = 0 
 
-        # Add node
-        G.add_node(current_id, 
-                   name=node.op.name, 
-                   qubits=[q._index for q in node.qargs],
-                   layer=current_layer,
-                   avg_qubit=avg_qubit)
+        # Add node (rustworkx assigns the integer index)
+        current_id = add_node(GateNode(node.op.name, tuple(q_indices), current_layer, avg_qubit))
         
         # Add edges
-        for q in node.qargs:
-            prev_id = last_node_on_qubit[q]
+        for g_idx, q_index in zip(g_indices, q_indices):
+            prev_id = last_node_on_qubit[g_idx]
             if prev_id != -1:
-                G.add_edge(prev_id, current_id, qubit=q._index)
+                add_edge(prev_id, current_id, {'qubit': q_index})
             
-            last_node_on_qubit[q] = current_id
-            qubit_depths[q] = current_layer
-        
-        current_id += 1
+            last_node_on_qubit[g_idx] = current_id
+            qubit_depths[g_idx] = current_layer
         
     return G
 
-def build_interaction_graph(circuit: QuantumCircuit) -> nx.MultiDiGraph:
+def build_interaction_graph(circuit: QuantumCircuit) -> rx.PyDiGraph:
     """
     Constructs an "Interaction Flow Graph".
     - Nodes: Represent a qubit at a specific interaction point.
              Label: "Q{index}"
-             Attributes: qubit_index, op_name, layer
+             Payload: QubitNode (qubit_index, op_name, layer)
     - Edges:
         1. Interaction Edges: Control -> Target (within the same gate).
         2. Flow Edges: PrevInstance -> CurrInstance (temporal flow along wire).
@@ -93,20 +111,24 @@ def build_interaction_graph(circuit: QuantumCircuit) -> nx.MultiDiGraph:
     circuit = flatten_circuit(circuit)
     dag = circuit_to_dag(circuit)
     
-    G = nx.MultiDiGraph()
+    G = rx.PyDiGraph(multigraph=True)
     
     # Map each qubit object to a unique global integer index
     # Note: q._index is relative to the register, so it collides across registers (e.g. a[0] and b[0] both have _index=0)
     # circuit.qubits list defines the global order.
+    # Note: DAG nodes hand out fresh Qubit wrappers, so this must stay keyed by value (not id()).
     q_map = {q: i for i, q in enumerate(circuit.qubits)}
+    num_qubits = len(circuit.qubits)
     
-    # Track the last node ID for each qubit to add Flow Edges
-    last_node_on_qubit = {q_map[q]: -1 for q in circuit.qubits}
+    # Track the last node ID for each qubit to add Flow Edges (indexed by global qubit index)
+    last_node_on_qubit = [-1] * num_qubits
     
     # Track depth for layout
-    qubit_depths = {q_map[q]: 0 for q in circuit.qubits}
+    qubit_depths = [0] * num_qubits
     
-    current_node_id = 0
+    # Bind graph methods once, outside the per-gate loop
+    add_node = G.add_node
+    add_edges_from = G.add_edges_from
     
     for node in dag.topological_op_nodes():
         qargs = node.qargs
@@ -115,54 +137,54 @@ def build_interaction_graph(circuit: QuantumCircuit) -> nx.MultiDiGraph:
             continue
             
         op_name = node.op.name
-        if op_name in ['barrier', 'snapshot', 'delay']:
+        if op_name in ('barrier', 'snapshot', 'delay'):
             continue
             
-        # Global indices for current operation qubits
-        current_qubit_indices = [q_map[q] for q in qargs]
+        # Global indices for current operation qubits (computed once, reused below)
+        q_indices = [q_map[q] for q in qargs]
             
         # Determine layer for this interaction
         # It must be after the max layer of input qubits
-        input_layer = max(qubit_depths[q_idx] for q_idx in current_qubit_indices)
-        current_layer = input_layer + 1
+        current_layer = max(qubit_depths[q_idx] for q_idx in q_indices) + 1
         
-        # Create a node for EACH qubit in this interaction
-        current_interaction_nodes = {} # qubit_global_idx -> node_id
+        # Create a node for EACH qubit in this interaction (same order as q_indices)
+        interaction_node_ids = []
+        # Flow/interaction edges of this gate, flushed in one batch
+        new_edges = []
         
-        for q in qargs:
-            q_idx = q_map[q]
-            G.add_node(current_node_id, 
-                       label=f"Q{q_idx}", 
-                       qubit_index=q_idx,
-                       op_name=op_name,
-                       layer=current_layer,
-                       type='qubit_instance')
+        for q_idx in q_indices:
+            current_node_id = add_node(QubitNode(f"Q{q_idx}", q_idx, op_name, current_layer, 'qubit_instance'))
             
-            current_interaction_nodes[q_idx] = current_node_id
+            interaction_node_ids.append(current_node_id)
             
             # Add Flow Edge (Time)
             prev_id = last_node_on_qubit[q_idx]
             if prev_id != -1:
-                G.add_edge(prev_id, current_node_id, type='flow', weight=1)
+                new_edges.append((prev_id, current_node_id, {'type': 'flow', 'weight': 1}))
             
             # Update trackers
             last_node_on_qubit[q_idx] = current_node_id
             qubit_depths[q_idx] = current_layer
             
-            current_node_id += 1
-            
         # Add Interaction Edges (Control -> Target)
         # Assumption: Last qubit is target, others are controls.
-        target_q = qargs[-1]
-        target_idx = q_map[target_q]
+        target_node_id = interaction_node_ids[-1]
         
-        control_qs = qargs[:-1]
-        control_indices = [q_map[q] for q in control_qs]
+        for control_node_id in interaction_node_ids[:-1]:
+            new_edges.append((control_node_id, target_node_id, {'type': 'interaction', 'weight': 2, 'label': op_name}))
         
-        target_node_id = current_interaction_nodes[target_idx]
-        
-        for c_idx in control_indices:
-            control_node_id = current_interaction_nodes[c_idx]
-            G.add_edge(control_node_id, target_node_id, type='interaction', weight=2, label=op_name)
+        add_edges_from(new_edges)
 
     return G
+
+def to_networkx(G: rx.PyDiGraph) -> nx.MultiDiGraph:
+    """
+    Converts a graph built above into an equivalent NetworkX MultiDiGraph.
+    Only needed at the edges of the pipeline (drawing, GraphML export, WL hashing).
+    """
+    nx_G = nx.MultiDiGraph()
+    for n in G.node_indices():
+        nx_G.add_node(n, **G[n]._asdict())
+    for u, v, data in G.weighted_edge_list():
+        nx_G.add_edge(u, v, **data)
+    return nx_G
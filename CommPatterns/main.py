@@ -2,7 +2,7 @@ import argparse
 import sys
 import networkx as nx
 from qiskit import QuantumCircuit
-from graph_builder import build_graph_from_circuit
+from graph_builder import build_graph_from_circuit, to_networkx
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze communication patterns in QASM files using a qubit dataflow graph.")
@@ -30,12 +30,12 @@ def main():
             G = build_interaction_graph(circuit)
             print(f"Interaction Graph constructed.")
 
-        print(f"Nodes: {G.number_of_nodes()}")
-        print(f"Edges: {G.number_of_edges()}")
+        print(f"Nodes: {G.num_nodes()}")
+        print(f"Edges: {G.num_edges()}")
         
         if args.output:
             print(f"Saving graph to {args.output}")
-            nx.write_graphml(G, args.output)
+            nx.write_graphml(to_networkx(G), args.output)
             
         if args.visualize:
             print("Visualizing graph...")
@@ -1,15 +1,66 @@
 import os
 import networkx as nx
+import qiskit
 from qiskit import QuantumCircuit
 from networkx.algorithms import isomorphism
 import collections
+import matplotlib
+matplotlib.use('Agg')  # figures are only ever saved to files, never shown
 import matplotlib.pyplot as plt
 from graph_builder import build_graph_from_circuit, build_interaction_graph
 from visualizer import visualize_graph, visualize_interaction_graph
 import sys
 import concurrent.futures
+import multiprocessing
 import random
 import argparse
+import hashlib
+import pickle
+import tempfile
+import itertools
+import math
+import numpy as np
+
+# Optional: nauty canonical labeling for subgraphs too symmetric to brute-force
+try:
+    import pynauty
+except ImportError:
+    pynauty = None
+
+# Optional: bliss canonical labeling through igraph, used when pynauty is not installed
+try:
+    import igraph
+except ImportError:
+    igraph = None
+
+# Optional: numba JIT for the random-walk sampler (pure Python fallback otherwise)
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# On-disk cache of built graphs (see build_graph_safe), kept in CACHE_SUBDIR of the
+# output directory. Bump GRAPH_CACHE_VERSION whenever the graph builders change their output.
+CACHE_SUBDIR = '.cache'
+GRAPH_CACHE_VERSION = 3
+
+# Per-process memo of canonical labels, keyed by the exact labelled structure of a subgraph.
+# Subgraphs are renumbered 0..n-1 in sorted node order, so a pattern that recurs across
+# samples, k-loops or files handled by the same worker is only hashed once.
+# Cleared when it reaches _CANON_CACHE_MAX entries (large comm-mode patterns rarely repeat).
+_canon_label_cache = {}
+_CANON_CACHE_MAX = 200_000
+
+# Subgraphs with at most this many candidate node orderings are canonicalized exactly
+# by brute force (always the case for k <= 6). Larger ones go to nauty, else bliss
+# (igraph), else WL.
+MAX_CANON_PERMUTATIONS = 720
+
+# Number of ESU root nodes enumerated per numba call (see esu_enumerate)
+ESU_ROOT_BATCH = 256
+
+# Added to every CNARW weight so candidates sharing all neighbors can still be picked
+CNARW_MIN_WEIGHT = 0.01
 
 def get_qasm_files(root_dir):
     qasm_files = []
@@ -25,218 +76,687 @@ def get_canon_label(g, mode='dataflow'):
     - mode='dataflow': Matches by Node Type (Operation Name). Edges just purely connectivity (plus count).
     - mode='comm': Matches by Edge Type (Interaction/Flow). Nodes are generic.
     """
-    # weisfeiler_lehman_graph_hash does not support MultiDiGraph directly.
-    # consistently convert to DiGraph.
+    node_labels, edge_labels = _labelled_structure(g, mode)
+    return canon_label(node_labels, edge_labels, mode)
+
+def canon_label(node_labels, edge_labels, mode='dataflow'):
+    """
+    Canonical label of a labelled structure as returned by _labelled_structure / _induced_structure.
+    Small subgraphs get an exact canonical form (_brute_force_canon); larger ones
+    fall back to nauty or bliss (igraph) if installed, else to the Weisfeiler-Lehman hash.
+    Results are memoized per process (see _canon_label_cache); the memo key is the
+    exact (order-dependent) structure, so two different subgraphs never share it.
+    """
+    key = (mode, tuple(node_labels), tuple(sorted(edge_labels.items())))
+    label = _canon_label_cache.get(key)
+    if label is None:
+        canon = _brute_force_canon(node_labels, edge_labels)
+        if canon is not None:
+            label = _digest(('exact', canon))
+        elif pynauty is not None:
+            label = _digest(('nauty', _nauty_canon(node_labels, edge_labels)))
+        elif igraph is not None:
+            label = _digest(('bliss', _bliss_canon(node_labels, edge_labels)))
+        else:
+            label = _wl_label(node_labels, edge_labels, mode)
+        if len(_canon_label_cache) >= _CANON_CACHE_MAX:
+            _canon_label_cache.clear()
+        _canon_label_cache[key] = label
+    return label
+
+def _digest(canon):
+    """Stable hex digest of a canonical form (same format as the WL hash; hash() is salted per process)."""
+    return hashlib.blake2b(repr(canon).encode(), digest_size=16).hexdigest()
+
+def _pack_edge_keys(edges, num_nodes):
+    """
+    Packs the (u, v) rows of an (E, 2) int64 edge array into 1-D keys u * num_nodes + v,
+    so edges can be deduplicated/counted with a plain 1-D np.unique (np.unique(axis=0)
+    on the (E, 2) array sorts rows as structured data and is much slower).
+    Unpack with keys // num_nodes, keys % num_nodes.
+    """
+    return edges[:, 0] * num_nodes + edges[:, 1]
+
+def _labelled_structure(g, mode):
+    """
+    Node labels (list indexed by node) and aggregated edge labels ({(u, v): label}) of g,
+    using the same matching rules as the WL path:
+    - dataflow: node label is the op name, edge label is the number of parallel edges.
+    - comm: generic node label, edge label is the sorted tuple of "type_label" tags.
+    """
+    if mode == 'comm':
+        node_labels = [''] * g.num_nodes()
+        edge_tags = collections.defaultdict(list)
+        for u, v, data in g.weighted_edge_list():
+            edge_tags[(u, v)].append(f"{data.get('type', 'unknown')}_{data.get('label', '')}")
+        edge_labels = {uv: tuple(sorted(tags)) for uv, tags in edge_tags.items()}
+        return node_labels, edge_labels
+    
+    node_labels = [d.name for d in g.nodes()]
+    # Parallel-edge counts in one np.unique over packed (u, v) keys
+    n = max(len(node_labels), 1)
+    edges = np.asarray(g.edge_list(), dtype=np.int64).reshape(-1, 2)
+    keys, counts = np.unique(_pack_edge_keys(edges, n), return_counts=True)
+    edge_labels = dict(zip(zip((keys // n).tolist(), (keys % n).tolist()), counts.tolist()))
+    return node_labels, edge_labels
+
+def labelled_adjacency(G, mode):
+    """
+    Per-graph lookup tables for hashing induced subgraphs without materializing them:
+    node_labels[n] and out_edges[n] = [(v, aggregated edge label), ...] sorted by v
+    (see _labelled_structure).
+    """
+    node_labels, edge_labels = _labelled_structure(G, mode)
+    out_edges = [[] for _ in range(len(node_labels))]
+    for (u, v), label in sorted(edge_labels.items()):
+        out_edges[u].append((v, label))
+    return node_labels, out_edges
+
+def _induced_structure(nodes, node_labels, out_edges):
+    """
+    _labelled_structure of the subgraph induced by nodes, read from labelled_adjacency tables.
+    Nodes are renumbered in sorted order, like subgraph() does. Since out_edges rows are
+    sorted too, edges come out already ordered and the memo key sort in canon_label is O(E).
+    """
+    order = sorted(nodes)
+    pos = {n: i for i, n in enumerate(order)}
+    pos_get = pos.get
+    sub_edges = {}
+    for pu, u in enumerate(order):
+        for v, label in out_edges[u]:
+            pv = pos_get(v)
+            if pv is not None:
+                sub_edges[(pu, pv)] = label
+    return [node_labels[n] for n in order], sub_edges
+
+def _brute_force_canon(node_labels, edge_labels):
+    """
+    Exact canonical form: nodes are sorted by an isomorphism invariant
+    (label, out-edge labels, in-edge labels) and every ordering of nodes tied on the
+    invariant is tried; the lexicographically smallest relabelled edge list wins.
+    Returns None if there are more than MAX_CANON_PERMUTATIONS orderings to try.
+    """
+    n = len(node_labels)
+    out_labels = [[] for _ in range(n)]
+    in_labels = [[] for _ in range(n)]
+    for (u, v), el in edge_labels.items():
+        out_labels[u].append(el)
+        in_labels[v].append(el)
+    invariant = [(node_labels[i], sorted(out_labels[i]), sorted(in_labels[i])) for i in range(n)]
+    
+    order = sorted(range(n), key=invariant.__getitem__)
+    groups = [list(grp) for _, grp in itertools.groupby(order, key=invariant.__getitem__)]
+    if math.prod(math.factorial(len(grp)) for grp in groups) > MAX_CANON_PERMUTATIONS:
+        return None
+    
+    best = None
+    for choice in itertools.product(*(itertools.permutations(grp) for grp in groups)):
+        pos = {node: i for i, node in enumerate(itertools.chain.from_iterable(choice))}
+        edges = tuple(sorted((pos[u], pos[v], el) for (u, v), el in edge_labels.items()))
+        if best is None or edges < best:
+            best = edges
+    return (tuple(node_labels[i] for i in order), best)
+
+def _nauty_canon(node_labels, edge_labels):
+    """
+    Canonical form via nauty. Labelled edges are encoded as extra vertices (u -> e -> v)
+    so that both node and edge labels become vertex colors; color classes are passed
+    to nauty in sorted order and included in the result.
+    """
+    n = len(node_labels)
+    colors = [('n', lbl) for lbl in node_labels]
+    adjacency = {i: [] for i in range(n)}
+    for e, ((u, v), el) in enumerate(edge_labels.items(), start=n):
+        colors.append(('e', el))
+        adjacency[u].append(e)
+        adjacency[e] = [v]
+    
+    classes = collections.defaultdict(set)
+    for vertex, color in enumerate(colors):
+        classes[color].add(vertex)
+    sorted_colors = sorted(classes)
     
+    graph = pynauty.Graph(len(colors), directed=True, adjacency_dict=adjacency,
+                          vertex_coloring=[classes[c] for c in sorted_colors])
+    return (tuple((c, len(classes[c])) for c in sorted_colors), pynauty.certificate(graph))
+
+def _bliss_canon(node_labels, edge_labels):
+    """
+    Canonical form via bliss (igraph.Graph.canonical_permutation), with the same
+    edge-as-vertex encoding as _nauty_canon. Colors are ranks in the sorted color list,
+    and the result lists them along with the canonically relabelled edges.
+    """
+    n = len(node_labels)
+    colors = [('n', lbl) for lbl in node_labels]
+    edges = []
+    for e, ((u, v), el) in enumerate(edge_labels.items(), start=n):
+        colors.append(('e', el))
+        edges.append((u, e))
+        edges.append((e, v))
+    
+    sorted_colors = sorted(set(colors))
+    rank = {c: i for i, c in enumerate(sorted_colors)}
+    color_ids = [rank[c] for c in colors]
+    
+    graph = igraph.Graph(n=len(colors), edges=edges, directed=True)
+    perm = graph.canonical_permutation(color=color_ids)
+    # perm[i] is the original vertex placed at canonical position i (as in permute_vertices)
+    pos = [0] * len(perm)
+    for i, vertex in enumerate(perm):
+        pos[vertex] = i
+    canon_colors = tuple(color_ids[vertex] for vertex in perm)
+    canon_edges = tuple(sorted((pos[u], pos[v]) for u, v in edges))
+    return (tuple(sorted_colors), canon_colors, canon_edges)
+
+def _wl_label(node_labels, edge_labels, mode):
+    # weisfeiler_lehman_graph_hash needs a NetworkX DiGraph (no MultiDiGraph support),
+    # so parallel edges arrive here already aggregated into one label.
     dg = nx.DiGraph()
-    for n, d in g.nodes(data=True):
-        # Allow Generic Node matching for 'comm' mode
-        if mode == 'comm':
-            dg.add_node(n, generic_label='node', **d)
-        else:
-            dg.add_node(n, **d)
+    for n, label in enumerate(node_labels):
+        # 'comm' mode: node labels are generic ('')
+        dg.add_node(n, label=label)
     
-    # Process edges
-    edge_attrs = collections.defaultdict(list)
-    for u, v, data in g.edges(data=True):
-        # We need to aggregate edge attributes for parallel edges
-        if mode == 'comm':
-             # Combine type + label (if exists) e.g. "interaction_cx", "flow_None"
-             etype = data.get('type', 'unknown')
-             elabel = data.get('label', '')
-             full_tag = f"{etype}_{elabel}"
-             edge_attrs[(u, v)].append(full_tag)
-        else:
-             # Dataflow mode: just count edges
-             edge_attrs[(u, v)].append('edge') # Placeholder, we count length later
-             
-    for (u, v), attrs in edge_attrs.items():
+    for (u, v), label in edge_labels.items():
         if mode == 'comm':
-            # Sort attributes to ensure canonical representation of parallel edges
-            sorted_attrs = sorted(attrs)
-            # Join into a single string
-            combined_attr = "|".join(sorted_attrs)
-            dg.add_edge(u, v, hash_label=combined_attr)
+            # Sorted "type_label" tags of the parallel edges, joined into a single string
+            dg.add_edge(u, v, label="|".join(label))
         else:
-            # Dataflow mode: replicate original logic (count as edge attribute)
-            count = len(attrs)
-            dg.add_edge(u, v, count=str(count)) 
+            # Dataflow mode: parallel edge count
+            dg.add_edge(u, v, label=str(label))
 
-    if mode == 'comm':
-        # Match by edge type, ignore node name
-        return nx.weisfeiler_lehman_graph_hash(dg, node_attr='generic_label', edge_attr='hash_label')
-    else:
-        # Match by node name, edge counts
-        return nx.weisfeiler_lehman_graph_hash(dg, node_attr='name', edge_attr='count')
+    return nx.weisfeiler_lehman_graph_hash(dg, node_attr='label', edge_attr='label')
+
+def _cache_path(file_path, mode, cache_dir):
+    """
+    Location of the cached graph for (file_path, mode) inside cache_dir.
+    Keyed by the SHA-256 of the QASM contents, so copies, moved files and files
+    whose mtime changed without an edit (e.g. a fresh checkout) share one entry.
+    The qiskit version is part of the key, since flatten_circuit depends on transpile().
+    """
+    with open(file_path, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    name = f"{content_hash}_{mode}_v{GRAPH_CACHE_VERSION}_qiskit{qiskit.__version__}.pkl"
+    return os.path.join(cache_dir, name)
 
 def build_graph_safe(args):
     """
     Worker function to build a graph from a QASM file.
     Returns (file_path, G) or (file_path, None) if failed.
-    args: (file_path, mode)
+    args: (file_path, mode, cache_dir)
+    Unless cache_dir is None, graphs are pickled to cache_dir and reused for any
+    QASM file with the same contents (skips parsing + flattening).
     """
-    file_path, mode = args
+    file_path, mode, cache_dir = args
     try:
+        cache_path = _cache_path(file_path, mode, cache_dir) if cache_dir else None
+        
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return (file_path, pickle.load(f))
+            except Exception:
+                pass # Unreadable cache entry, rebuild below
+        
         qc = QuantumCircuit.from_qasm_file(file_path)
         if mode == 'comm':
             G = build_interaction_graph(qc)
         else:
             G = build_graph_from_circuit(qc)
+        
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+                # Write then rename so concurrent runs never see a partial pickle
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
         return (file_path, G)
     except Exception as e:
         # print(f"Error building {file_path}: {e}")
         return (file_path, None)
 
-def find_subgraphs_of_size_k(G, k):
+def esu_enumerate(G, k, roots=None, csr=None, max_subgraphs=None):
     """
-    Finds all connected induced subgraphs of size k in G (Exhaustive).
-    Returns a set of frozenset(nodes).
+    Wernicke's ESU algorithm: yields every connected induced subgraph of size k
+    (connectivity ignores edge direction) exactly once, as a frozenset of nodes
+    (a tuple on the numba path, which is cheaper to build).
+    Each subgraph is rooted at its smallest node v; only nodes > v are ever added,
+    and a node enters the extension set only via the first subgraph node adjacent to it.
+    roots: optional subset of root nodes. Subgraphs are partitioned by root, so
+    disjoint root sets can be enumerated independently (in parallel).
+    csr: optional precomputed undirected_csr(G), used by the numba path.
+    max_subgraphs: optional budget (>= 1). Enumeration stops after the root that brings
+    the count to max_subgraphs; roots are never cut short.
     """
+    if max_subgraphs is not None and max_subgraphs < 1:
+        raise ValueError(f"max_subgraphs must be at least 1, got {max_subgraphs}")
     if k < 1:
-        return set()
+        return
     
-    current_subgraphs = {frozenset([n]) for n in G.nodes()}
+    found_total = 0
+    if numba is not None:
+        indptr, indices = csr if csr is not None else undirected_csr(G)
+        if roots is None:
+            roots = range(G.num_nodes())
+        roots = np.asarray(roots, dtype=np.int32)
+        # Scratch state shared by all roots (all marks are cleared again after each root)
+        mark = np.full(indptr.shape[0] - 1, -1, dtype=np.int32)
+        marked = np.empty(indptr.shape[0] - 1, dtype=np.int32)
+        # Roots are handed over in batches to bound the size of each result array
+        for start in range(0, len(roots), ESU_ROOT_BATCH):
+            budget = -1 if max_subgraphs is None else max_subgraphs - found_total
+            found = _esu_roots(indptr, indices, k, roots[start:start + ESU_ROOT_BATCH], mark, marked, budget)
+            yield from map(tuple, found.tolist())
+            found_total += len(found)
+            if max_subgraphs is not None and found_total >= max_subgraphs:
+                return
+        return
     
-    for size in range(2, k + 1):
-        next_subgraphs = set()
-        for nodes in current_subgraphs:
-            neighborhood = set()
-            for n in nodes:
-                neighborhood.update(G.successors(n))
-                neighborhood.update(G.predecessors(n))
+    # Undirected adjacency, built once (O(E))
+    adj = {n: set(G.neighbors_undirected(n)) for n in G.node_indices()}
+    
+    for v in (adj if roots is None else roots):
+        v_adj = adj[v]
+        extension = {u for u in v_adj if u > v}
+        for subgraph in _esu_extend(adj, k, v, frozenset([v]), v_adj | {v}, extension):
+            found_total += 1
+            yield subgraph
+        if max_subgraphs is not None and found_total >= max_subgraphs:
+            return
+
+def _esu_extend(adj, k, v, subgraph, closed_nbhd, extension):
+    """
+    closed_nbhd: subgraph plus all of its neighbors.
+    New extension candidates are the exclusive neighbors of the added node (not in closed_nbhd).
+    """
+    if len(subgraph) == k:
+        yield subgraph
+        return
+    if len(subgraph) == k - 1:
+        # Last level: each extension node completes a subgraph, so the extended
+        # neighborhood/extension sets would never be used
+        for w in extension:
+            yield subgraph | {w}
+        return
+    
+    extension = set(extension)
+    while extension:
+        w = extension.pop()
+        new_extension = extension | {u for u in adj[w] if u > v and u not in closed_nbhd}
+        yield from _esu_extend(adj, k, v, subgraph | {w}, closed_nbhd | adj[w], new_extension)
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _esu_roots(indptr, indices, k, roots, mark, marked, budget):
+        """
+        Iterative ESU (same traversal as _esu_extend) over the CSR adjacency for each root in roots.
+        ext[d, :ext_len[d]] is the extension set of the subgraph sub[:d + 1]; mark[u] >= 0 iff u is
+        in the subgraph's closed neighborhood, and marked[] records marks so they can be undone
+        when backtracking. Returns the found subgraphs as rows of an (n, k) array.
+        budget >= 0: stop after the root that brings the count to budget (-1 = no limit).
+        """
+        max_degree = 0
+        for n in range(indptr.shape[0] - 1):
+            max_degree = max(max_degree, indptr[n + 1] - indptr[n])
+        cap = min(indptr.shape[0] - 1, k * max_degree + 1)
+        sub = np.empty(k, dtype=np.int32)
+        ext = np.empty((k, cap), dtype=np.int32)
+        ext_len = np.zeros(k, dtype=np.int64)
+        mark_start = np.zeros(k, dtype=np.int64)
+        out = np.empty((64, k), dtype=np.int32)
+        n_out = 0
+        
+        for v in roots:
+            if budget >= 0 and n_out >= budget:
+                break
+            if k == 1:
+                if n_out == out.shape[0]:
+                    out = np.concatenate((out, np.empty_like(out)))
+                out[n_out, 0] = v
+                n_out += 1
+                continue
             
-            neighborhood.difference_update(nodes)
+            sub[0] = v
+            mark[v] = 0
+            marked[0] = v
+            top = 1
+            ext_len[0] = 0
+            for p in range(indptr[v], indptr[v + 1]):
+                u = indices[p]
+                if mark[u] < 0:
+                    mark[u] = 0
+                    marked[top] = u
+                    top += 1
+                if u > v:
+                    ext[0, ext_len[0]] = u
+                    ext_len[0] += 1
             
-            for neighbor in neighborhood:
-                new_subgraph = set(nodes)
-                new_subgraph.add(neighbor)
-                next_subgraphs.add(frozenset(new_subgraph))
+            d = 0
+            while d >= 0:
+                if ext_len[d] == 0:
+                    # Extension set exhausted: undo this level's marks and backtrack
+                    if d > 0:
+                        while top > mark_start[d]:
+                            top -= 1
+                            mark[marked[top]] = -1
+                    d -= 1
+                    continue
                 
-        current_subgraphs = next_subgraphs
-        if not current_subgraphs:
-            break
+                ext_len[d] -= 1
+                w = ext[d, ext_len[d]]
+                if d + 2 == k:
+                    # Last level: w completes a subgraph
+                    if n_out == out.shape[0]:
+                        out = np.concatenate((out, np.empty_like(out)))
+                    out[n_out, :d + 1] = sub[:d + 1]
+                    out[n_out, d + 1] = w
+                    n_out += 1
+                    continue
+                
+                # Extend with w: remaining extension plus w's exclusive neighbors > v
+                sub[d + 1] = w
+                m = ext_len[d]
+                ext[d + 1, :m] = ext[d, :m]
+                mark_start[d + 1] = top
+                for p in range(indptr[w], indptr[w + 1]):
+                    u = indices[p]
+                    if mark[u] < 0:
+                        mark[u] = d + 1
+                        marked[top] = u
+                        top += 1
+                        if u > v:
+                            ext[d + 1, m] = u
+                            m += 1
+                ext_len[d + 1] = m
+                d += 1
             
-    return current_subgraphs
+            while top > 0:
+                top -= 1
+                mark[marked[top]] = -1
+        return out[:n_out]
+
+    # Compile (or load from numba's on-disk cache) once at import, so forked workers inherit it
+    _esu_roots(np.array([0, 1, 2], dtype=np.int32), np.array([1, 0], dtype=np.int32), 2,
+               np.array([0, 1], dtype=np.int32), np.full(2, -1, dtype=np.int32), np.empty(2, dtype=np.int32), -1)
 
-def sample_subgraphs_of_size_k(G, k, num_samples=2000):
+def undirected_csr(G):
+    """
+    Undirected neighbor lists of G in CSR form: the neighbors of node n are
+    indices[indptr[n]:indptr[n+1]] (sorted, parallel edges and self-loops removed).
+    Assumes contiguous node indices 0..N-1, as produced by the graph builders.
+    """
+    num_nodes = G.num_nodes()
+    edges = np.array(G.edge_list(), dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    # Both directions, deduplicated with one np.unique over packed keys (see _pack_edge_keys)
+    keys = np.unique(np.concatenate([_pack_edge_keys(edges, num_nodes),
+                                     _pack_edge_keys(edges[:, ::-1], num_nodes)]))
+    
+    indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(keys // num_nodes, minlength=num_nodes), out=indptr[1:])
+    indices = (keys % num_nodes).astype(np.int32)
+    return indptr, indices
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _row_jaccard(indptr, indices, a, b):
+        """Jaccard similarity of the (sorted) CSR rows of nodes a and b."""
+        i, i_end = indptr[a], indptr[a + 1]
+        j, j_end = indptr[b], indptr[b + 1]
+        union = (i_end - i) + (j_end - j)
+        if union == 0:
+            return 0.0
+        common = 0
+        while i < i_end and j < j_end:
+            if indices[i] == indices[j]:
+                common += 1
+                i += 1
+                j += 1
+            elif indices[i] < indices[j]:
+                i += 1
+            else:
+                j += 1
+        return common / (union - common)
+
+    @numba.njit(cache=True)
+    def _sample_one(indptr, indices, k, out, frontier, state, cnarw, weights):
+        """
+        Grows one connected sample in out[:k] from a uniform random start node, adding a
+        uniformly chosen node of the current neighborhood at each step.
+        frontier[:n_front] holds the distinct neighbors of the sample, grown by the row of each
+        added node; state[n] is 1 for frontier nodes, 2 for sampled ones, 0 otherwise (only the
+        touched entries are reset before returning).
+        cnarw: pick candidates with weight 1 - Jaccard(last added node, candidate) instead of
+        uniformly (weights is scratch space, see sample_subgraphs_of_size_k).
+        Returns False if the walk gets stuck before reaching k nodes.
+        """
+        node = np.random.randint(indptr.shape[0] - 1)
+        out[0] = node
+        state[node] = 2
+        size = 1
+        n_front = 0
+        while size < k:
+            for p in range(indptr[node], indptr[node + 1]):
+                nb = indices[p]
+                if state[nb] == 0:
+                    state[nb] = 1
+                    frontier[n_front] = nb
+                    n_front += 1
+            if n_front == 0:
+                break
+            # Uniform (or CNARW-weighted) pick, removed from the frontier by swapping in the last entry
+            i = np.random.randint(n_front)
+            if cnarw:
+                total = 0.0
+                for j in range(n_front):
+                    weights[j] = 1.0 - _row_jaccard(indptr, indices, node, frontier[j]) + CNARW_MIN_WEIGHT
+                    total += weights[j]
+                r = np.random.random() * total
+                i = 0
+                while i < n_front - 1 and r >= weights[i]:
+                    r -= weights[i]
+                    i += 1
+            node = frontier[i]
+            n_front -= 1
+            frontier[i] = frontier[n_front]
+            state[node] = 2
+            out[size] = node
+            size += 1
+        
+        for i in range(size):
+            state[out[i]] = 0
+        for i in range(n_front):
+            state[frontier[i]] = 0
+        return size == k
+
+    @numba.njit(cache=True)
+    def _sample_many(indptr, indices, k, num_samples, seed, cnarw):
+        """Runs _sample_one num_samples times; returns (samples[num_samples, k], valid[num_samples])."""
+        np.random.seed(seed)
+        max_degree = 0
+        for n in range(indptr.shape[0] - 1):
+            max_degree = max(max_degree, indptr[n + 1] - indptr[n])
+        frontier = np.empty(k * max_degree + 1, dtype=np.int32)
+        weights = np.empty(k * max_degree + 1, dtype=np.float64)
+        state = np.zeros(indptr.shape[0] - 1, dtype=np.int8)
+        samples = np.zeros((num_samples, k), dtype=np.int32)
+        valid = np.zeros(num_samples, dtype=np.bool_)
+        for s in range(num_samples):
+            valid[s] = _sample_one(indptr, indices, k, samples[s], frontier, state, cnarw, weights)
+        return samples, valid
+
+    # Compiled at import, like _esu_roots above
+    _sample_many(np.array([0, 1, 2], dtype=np.int32), np.array([1, 0], dtype=np.int32), 2, 1, 0, False)
+
+def sample_subgraphs_of_size_k(G, k, num_samples=2000, csr=None, cnarw=False):
     """
     Samples connected induced subgraphs of size k in G.
-    Returns a list of frozenset(nodes).
+    csr: optional precomputed undirected_csr(G).
+    cnarw: common-neighbor-aware expansion (after CNARW): a frontier node c is picked with
+    weight 1 - Jaccard(N(last), N(c)) + CNARW_MIN_WEIGHT, where last is the node added last,
+    so the sample moves away from densely shared neighborhoods faster. This biases the
+    pattern frequencies relative to uniform expansion.
+    Generator: yields each sample as a frozenset(nodes) as soon as it is drawn.
     """
-    samples = []
-    nodes = list(G.nodes())
+    nodes = list(G.node_indices())
     if not nodes:
-        return []
+        return
+    
+    if csr is None:
+        csr = undirected_csr(G)
+    indptr, indices = csr
+    
+    if numba is not None:
+        # JIT path. Seed from `random` (re-seeded per process after fork) so pool
+        # workers do not all replay the same numba RNG stream.
+        samples, valid = _sample_many(indptr, indices, k, num_samples, random.getrandbits(32), cnarw)
+        for row in samples[valid]:
+            yield frozenset(row.tolist())
+        return
 
     for _ in range(num_samples):
         # 1. Pick random start node
-        curr_nodes = {random.choice(nodes)}
+        next_node = random.choice(nodes)
+        curr_nodes = {next_node}
+        # Neighbors of the current set (frontier), grown by the CSR row of each added node;
+        # seen = curr_nodes | frontier
+        frontier = []
+        seen = {next_node}
         
         # 2. Iteratively expand
         valid_sample = True
         for _ in range(k - 1):
-            # Find neighbors of current set
-            neighbors = set()
-            for n in curr_nodes:
-                neighbors.update(G.successors(n))
-                neighbors.update(G.predecessors(n))
-            
-            neighbors.difference_update(curr_nodes)
-            
-            if not neighbors:
+            for nb in indices[indptr[next_node]:indptr[next_node + 1]].tolist():
+                if nb not in seen:
+                    seen.add(nb)
+                    frontier.append(nb)
+            if not frontier:
                 valid_sample = False
                 break
                 
-            # Pick random neighbor
-            next_node = random.choice(list(neighbors))
+            # Pick random (or CNARW-weighted) neighbor, removed from the frontier by swapping in the last entry
+            if cnarw:
+                last_row = set(indices[indptr[next_node]:indptr[next_node + 1]].tolist())
+                weights = []
+                for c in frontier:
+                    row = indices[indptr[c]:indptr[c + 1]].tolist()
+                    common = len(last_row.intersection(row))
+                    union = len(last_row) + len(row) - common
+                    weights.append(1.0 - (common / union if union else 0.0) + CNARW_MIN_WEIGHT)
+                i = random.choices(range(len(frontier)), weights=weights)[0]
+            else:
+                i = random.randrange(len(frontier))
+            next_node = frontier[i]
+            frontier[i] = frontier[-1]
+            frontier.pop()
             curr_nodes.add(next_node)
             
         if valid_sample:
-            samples.append(frozenset(curr_nodes))
-            
-    return samples
+            yield frozenset(curr_nodes)
 
-def count_interaction_edges(G_sub):
-    count = 0
-    for u, v, data in G_sub.edges(data=True):
+def interaction_adjacency(G):
+    """
+    Interaction-edge lookup tables for sample_subgraphs_by_interaction_k:
+    (interaction_edges, inter_out, inter_in). interaction_edges lists every interaction
+    edge (u, v); inter_out[n] / inter_in[n] are the interaction successors / predecessors
+    of n. Parallel edges are repeated everywhere, so each one counts towards k.
+    """
+    num_nodes = G.num_nodes()
+    interaction_edges = []
+    inter_out = [[] for _ in range(num_nodes)]
+    inter_in = [[] for _ in range(num_nodes)]
+    for u, v, data in G.weighted_edge_list():
         if data.get('type') == 'interaction':
-            count += 1
-    return count
+            interaction_edges.append((u, v))
+            inter_out[u].append(v)
+            inter_in[v].append(u)
+    return interaction_edges, inter_out, inter_in
 
-def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
+def _add_to_sample(n, curr_nodes, frontier, where, csr, inter_out, inter_in):
+    """
+    Adds node n to curr_nodes and keeps frontier (neighbors of curr_nodes not in it,
+    frontier[where[x]] == x) up to date. Returns the number of interaction edges
+    between n and the previous curr_nodes.
+    """
+    if n in curr_nodes:
+        return 0
+    added = 0
+    for v in inter_out[n]:
+        if v in curr_nodes:
+            added += 1
+    for u in inter_in[n]:
+        if u in curr_nodes:
+            added += 1
+    curr_nodes.add(n)
+    
+    i = where.pop(n, None)
+    if i is not None:
+        last = frontier.pop()
+        if i < len(frontier):
+            frontier[i] = last
+            where[last] = i
+    
+    indptr, indices = csr
+    for nb in indices[indptr[n]:indptr[n + 1]].tolist():
+        if nb not in curr_nodes and nb not in where:
+            where[nb] = len(frontier)
+            frontier.append(nb)
+    return added
+
+def sample_subgraphs_by_interaction_k(G, k, num_samples=2000, csr=None, inter=None):
     """
     Samples connected subgraphs that contain exactly k interaction edges.
     Used for 'comm' mode.
+    csr / inter: optional precomputed undirected_csr(G) / interaction_adjacency(G).
+    Generator: yields each sample as a frozenset(nodes) as soon as it is drawn.
     """
-    samples = []
+    if csr is None:
+        csr = undirected_csr(G)
+    if inter is None:
+        inter = interaction_adjacency(G)
     
-    # 1. Identify all interaction edges to start from
-    interaction_edges = []
-    for u, v, data in G.edges(data=True):
-         if data.get('type') == 'interaction':
-             interaction_edges.append((u, v))
-             
+    # 1. All interaction edges to start from
+    interaction_edges, inter_out, inter_in = inter
     if not interaction_edges:
-        return []
+        return
         
     for _ in range(num_samples):
-        # Start with a random interaction edge
+        # Start with a random interaction edge.
+        # curr_k (interaction edges inside curr_nodes) and the frontier are
+        # maintained incrementally as nodes are added
         start_u, start_v = random.choice(interaction_edges)
-        curr_nodes = {start_u, start_v}
-        
-        # Check current count (should be >= 1)
-        sub = G.subgraph(curr_nodes)
-        curr_k = count_interaction_edges(sub)
+        curr_nodes = set()
+        frontier = []
+        where = {}
+        curr_k = _add_to_sample(start_u, curr_nodes, frontier, where, csr, inter_out, inter_in)
+        curr_k += _add_to_sample(start_v, curr_nodes, frontier, where, csr, inter_out, inter_in)
         
         # If we start with > k, we can't do anything (unless we shrink, but ignoring for now)
         if curr_k > k:
             continue 
         
         if curr_k == k:
-            samples.append(frozenset(curr_nodes))
+            yield frozenset(curr_nodes)
             continue
             
         # Expand
         valid_sample = False
         # Limit expansion attempts
-        # Limit expansion attempts
         max_attempts = k * 10 
         for _ in range(max_attempts):
-            # Find neighbors
-            neighbors = set()
-            for n in curr_nodes:
-                neighbors.update(G.successors(n))
-                neighbors.update(G.predecessors(n))
-            
-            neighbors.difference_update(curr_nodes)
-            
-            if not neighbors:
+            if not frontier:
                 break 
                 
             # Pick random neighbor
-            next_node = random.choice(list(neighbors))
+            next_node = random.choice(frontier)
             
-            # Identify "Atomic Unit": next_node + all its interaction partners
-            nodes_to_add = {next_node}
-            
-            # Check outgoing interaction edges from next_node
-            for succ in G.successors(next_node):
-                # G is MultiDiGraph, check edge data
-                # We need all edges between next_node and succ
-                for key in G[next_node][succ]:
-                     if G[next_node][succ][key].get('type') == 'interaction':
-                         nodes_to_add.add(succ)
-                         
-            # Check outgoing interaction edges TO next_node (incoming)
-            for pred in G.predecessors(next_node):
-                for key in G[pred][next_node]:
-                     if G[pred][next_node][key].get('type') == 'interaction':
-                         nodes_to_add.add(pred)
-
-            curr_nodes.update(nodes_to_add)
-            
-            sub = G.subgraph(curr_nodes)
-            curr_k = count_interaction_edges(sub)
+            # Add the "Atomic Unit": next_node + all its interaction partners
+            # (in- and outgoing, every parallel edge)
+            for n in [next_node] + inter_out[next_node] + inter_in[next_node]:
+                curr_k += _add_to_sample(n, curr_nodes, frontier, where, csr, inter_out, inter_in)
             
             if curr_k == k:
                 valid_sample = True
@@ -246,48 +766,107 @@ def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
                 break
         
         if valid_sample:
-            samples.append(frozenset(curr_nodes))
-            
-    return samples
+            yield frozenset(curr_nodes)
+
+# Worker-side state of the mining pool (see _init_worker): the graphs, loaded once
+# per worker, per-graph lookup tables built on first use, and per-graph memos of
+# {sampled node set: canonical label} kept across tasks (see mine_graph_k)
+_GRAPHS = []
+_GRAPH_TABLES = {}
+_NODE_SET_LABELS = {}
+
+def _init_worker(graphs_path):
+    """
+    Pool initializer: load the pickled graph list into _GRAPHS.
+    graphs_path=None means the worker was forked and already inherited _GRAPHS.
+    """
+    global _GRAPHS
+    if graphs_path is not None:
+        with open(graphs_path, 'rb') as f:
+            _GRAPHS = pickle.load(f)
+    _GRAPH_TABLES.clear()
+    _NODE_SET_LABELS.clear()
+
+def _graph_tables(g_idx, mode):
+    """(csr, node_labels, out_edges) for _GRAPHS[g_idx], computed once per worker."""
+    key = (g_idx, mode)
+    if key not in _GRAPH_TABLES:
+        G = _GRAPHS[g_idx]
+        _GRAPH_TABLES[key] = (undirected_csr(G),) + labelled_adjacency(G, mode)
+    return _GRAPH_TABLES[key]
+
+def _interaction_tables(g_idx):
+    """interaction_adjacency(_GRAPHS[g_idx]), computed once per worker."""
+    key = (g_idx, 'interaction')
+    if key not in _GRAPH_TABLES:
+        _GRAPH_TABLES[key] = interaction_adjacency(_GRAPHS[g_idx])
+    return _GRAPH_TABLES[key]
 
 def mine_graph_k(args):
     """
-    Worker function to mine patterns of size k from a single graph G.
-    args: (G, k, g_idx, num_samples, use_sampling, mode)
+    Worker function to mine patterns of size k from a single graph _GRAPHS[g_idx].
+    args: (k, g_idx, num_samples, use_sampling, mode, roots, cnarw, max_subgraphs)
+    roots: exhaustive mode only, the ESU root nodes handled by this task (None = all)
+    cnarw: dataflow sampling only, see sample_subgraphs_of_size_k
+    max_subgraphs: exhaustive mode only, optional budget for this task (see esu_enumerate)
     Returns: (g_idx, hash_counts, total_units, dict_of_examples)
+    Examples are node sets of G; the parent materializes the few it reports.
     """
-    G, k, g_idx, num_samples, use_sampling, mode = args
+    k, g_idx, num_samples, use_sampling, mode, roots, cnarw, max_subgraphs = args
+    G = _GRAPHS[g_idx]
     if G is None:
         return (g_idx, collections.Counter(), 0, {})
     
-    if G.number_of_nodes() < k:
+    if G.num_nodes() < k:
          return (g_idx, collections.Counter(), 0, {})
 
+    # Flattened adjacency + label/edge lookup tables (samples are hashed without building a subgraph)
+    csr, node_labels, out_edges = _graph_tables(g_idx, mode)
+
     if use_sampling:
         if mode == 'comm':
-             subgraphs = sample_subgraphs_by_interaction_k(G, k, num_samples)
+             subgraphs = sample_subgraphs_by_interaction_k(G, k, num_samples, csr=csr, inter=_interaction_tables(g_idx))
         else:
-             subgraphs = sample_subgraphs_of_size_k(G, k, num_samples)
+             subgraphs = sample_subgraphs_of_size_k(G, k, num_samples, csr=csr, cnarw=cnarw)
     else:
-        # Exhaustive search
-        subgraphs = find_subgraphs_of_size_k(G, k)
-        # Convert set to list for consistent processing logic
-        subgraphs = list(subgraphs)
+        # Exhaustive search (ESU generator)
+        if max_subgraphs is not None:
+            # Budgeted: whole roots are enumerated in random order until the budget is spent.
+            # Every subgraph is found from exactly one root, so the counted subgraphs are those
+            # of a random subset of roots (an estimate, not an exact census).
+            roots = list(G.node_indices() if roots is None else roots)
+            random.shuffle(roots)
+        subgraphs = esu_enumerate(G, k, roots, csr=csr, max_subgraphs=max_subgraphs)
 
-    total_units = len(subgraphs)
-    
+    # Single streaming pass: subgraphs are hashed as they are produced,
+    # only the counts and one example node set per pattern are kept
+    total_units = 0
     hash_counts = collections.Counter()
     examples = {}
     
+    # Two-stage dedup for sampling: the same node set is drawn many times, and within one
+    # graph it always has the same label, so only new node sets reach canon_label
+    # (which has its own memo on the exact labelled structure). The node set memo lives
+    # for the whole worker, so repeats across the sampling chunks of a graph (and across
+    # the k-loop) are reused too; cleared when it reaches _CANON_CACHE_MAX entries.
+    # ESU never repeats a set, so exhaustive runs skip it.
+    label_of_nodes = _NODE_SET_LABELS.setdefault((g_idx, mode), {}) if use_sampling else None
+    
     for nodes in subgraphs:
-        sub_G = G.subgraph(nodes).copy()
-        # Compute hash using mode-specific strategy
-        h = get_canon_label(sub_G, mode=mode)
+        total_units += 1
+        h = label_of_nodes.get(nodes) if use_sampling else None
+        if h is None:
+            # Compute hash using mode-specific strategy
+            h = canon_label(*_induced_structure(nodes, node_labels, out_edges), mode=mode)
+            if use_sampling:
+                if len(label_of_nodes) >= _CANON_CACHE_MAX:
+                    label_of_nodes.clear()
+                label_of_nodes[nodes] = h
         
         hash_counts[h] += 1
         
         if h not in examples:
-            examples[h] = sub_G
+            examples[h] = nodes
             
     return (g_idx, hash_counts, total_units, examples)
 
@@ -303,7 +882,7 @@ def collect_files(inputs):
                         qasm_files.append(os.path.join(root, file))
     return qasm_files
 
-def mine_patterns(inputs, min_support=0.5, k_min=2, k_max=3, num_samples=2000, use_sampling=True, mode='dataflow', output_dir='results'):
+def mine_patterns(inputs, min_support=0.5, k_min=2, k_max=3, num_samples=2000, use_sampling=True, mode='dataflow', output_dir='results', use_cache=True, cnarw=False, max_subgraphs=None):
     files = collect_files(inputs)
     print(f"Found {len(files)} QASM files.")
     
@@ -331,8 +910,9 @@ def mine_patterns(inputs, min_support=0.5, k_min=2, k_max=3, num_samples=2000, u
     graphs = []
     
     print(f"Building graphs in parallel (Mode: {mode})...")
-    # Pack args for build_graph_safe
-    build_args = [(f, mode) for f in files]
+    # Pack args for build_graph_safe; the graph cache lives next to the results
+    cache_dir = os.path.join(output_dir, CACHE_SUBDIR) if use_cache else None
+    build_args = [(f, mode, cache_dir) for f in files]
     
     with concurrent.futures.ProcessPoolExecutor() as executor:
         results = executor.map(build_graph_safe, build_args)
@@ -344,78 +924,122 @@ def mine_patterns(inputs, min_support=0.5, k_min=2, k_max=3, num_samples=2000, u
     print(f"Successfully built {len(graphs)} graphs.")
     
     mode_str = f"Sampling {num_samples} per graph" if use_sampling else "Exhaustive Search"
+    if not use_sampling and max_subgraphs is not None:
+        mode_str += f", at most ~{max_subgraphs} subgraphs per graph"
     
-    for k in range(k_min, k_max + 1):
-        print(f"Mining size {k} patterns ({mode_str})...")
-        
-        # Create k-specific folder
-        k_out_path = os.path.join(base_out_path, f"k{k}")
-        os.makedirs(k_out_path, exist_ok=True)
-        
-        global_pattern_counts = collections.Counter()
-        global_total_units = 0
-        pattern_examples = {} 
-        
-        # Add mode to worker args
-        worker_args = []
-        chunk_size = 500
-        
-        for i, G in enumerate(graphs):
-            if use_sampling:
-                # Split num_samples into chunks for better parallelization
-                remaining = num_samples
-                while remaining > 0:
-                     curr = min(remaining, chunk_size)
-                     worker_args.append((G, k, i, curr, use_sampling, mode))
-                     remaining -= curr
-            else:
-                # Exhaustive search, one task per graph
-                worker_args.append((G, k, i, num_samples, use_sampling, mode))
-        
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            # Increase chunksize for executor map since we have more tasks now
-            results = executor.map(mine_graph_k, worker_args, chunksize=1)
+    # Ship the graphs to the mining workers once, tasks only carry the graph index.
+    # Forked workers inherit _GRAPHS copy-on-write, so nothing is serialized; with
+    # other start methods each worker loads them from a pickle at startup.
+    _GRAPHS[:] = graphs
+    graphs_path = None
+    if multiprocessing.get_start_method() != 'fork':
+        fd, graphs_path = tempfile.mkstemp(prefix='mdn_graphs_', suffix='.pkl')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(graphs, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    # One pool for all k
+    n_procs = os.cpu_count() or 1
+    pool = multiprocessing.Pool(processes=n_procs, initializer=_init_worker, initargs=(graphs_path,))
+    
+    # Top patterns of every k are drawn into one summary figure (one row per k),
+    # so the figure setup and savefig cost is paid once per run
+    n_rows = k_max - k_min + 1
+    fig = plt.figure(figsize=(18, 6 * n_rows))
+    try:
+        for k in range(k_min, k_max + 1):
+            print(f"Mining size {k} patterns ({mode_str})...")
+            
+            global_pattern_counts = collections.Counter()
+            global_total_units = 0
+            pattern_examples = {} 
+            
+            # Add mode to worker args
+            worker_args = []
+            chunk_size = 500
+            root_chunks = max(1, n_procs // max(1, len(graphs)))
+            
+            for i, G in enumerate(graphs):
+                if use_sampling:
+                    # Split num_samples into chunks for better parallelization
+                    remaining = num_samples
+                    while remaining > 0:
+                         curr = min(remaining, chunk_size)
+                         worker_args.append((k, i, curr, use_sampling, mode, None, cnarw, None))
+                         remaining -= curr
+                else:
+                    # Exhaustive search: split each graph's ESU roots so that a few
+                    # large graphs still keep every worker busy (the budget is split between them)
+                    nodes = list(G.node_indices())
+                    n_chunks = max(1, min(len(nodes), root_chunks))
+                    chunk_budget = None if max_subgraphs is None else -(-max_subgraphs // n_chunks)
+                    for c in range(n_chunks):
+                        worker_args.append((k, i, num_samples, use_sampling, mode, nodes[c::n_chunks], False, chunk_budget))
+            
+            # Batch small tasks per IPC round-trip, but keep enough chunks for load balancing
+            # Results are merged in completion order, so one huge graph does not hold back the rest
+            results = pool.imap_unordered(mine_graph_k, worker_args, chunksize=max(1, len(worker_args) // (4 * n_procs)))
             
             for g_idx, hash_counts, total_units, examples in results:
                 global_total_units += total_units
                 global_pattern_counts.update(hash_counts)
                 
-                for h in hash_counts:
-                    if h not in pattern_examples:
-                        pattern_examples[h] = examples[h]
+                # Keep the smallest (graph, nodes) example so the report does not depend on completion order
+                for h, nodes in examples.items():
+                    candidate = (g_idx, tuple(sorted(nodes)))
+                    if h not in pattern_examples or candidate < pattern_examples[h]:
+                        pattern_examples[h] = candidate
 
-        # Filter by support
-        print(f"  Found {len(global_pattern_counts)} unique patterns of size {k}")
-        print(f"  Total subgraphs/samples analyzed: {global_total_units}")
-        
-        sorted_patterns = sorted(global_pattern_counts.items(), key=lambda x: x[1], reverse=True)
-        
-        for i, (h, count) in enumerate(sorted_patterns[:5]):
-             if global_total_units > 0:
-                 frequency = count / global_total_units
-             else:
-                 frequency = 0
+            # Filter by support
+            print(f"  Found {len(global_pattern_counts)} unique patterns of size {k}")
+            print(f"  Total subgraphs/samples analyzed: {global_total_units}")
+            
+            sorted_patterns = sorted(global_pattern_counts.items(), key=lambda x: (-x[1], x[0]))
+            
+            for i, (h, count) in enumerate(sorted_patterns[:5]):
+                 if global_total_units > 0:
+                     frequency = count / global_total_units
+                 else:
+                     frequency = 0
+                     
+                 print(f"  Pattern {h[:8]}... Freq: {frequency:.2%} ({count}/{global_total_units})")
+                 # Print structure glimpse
+                 ex_idx, ex_nodes = pattern_examples[h]
+                 example = graphs[ex_idx].subgraph(list(ex_nodes))
+                 names = [getattr(example[n], 'op_name' if mode=='comm' else 'name') for n in example.node_indices()]
+                 print(f"    Nodes: {names}")
+                 print(f"    Edges: {example.num_edges()}")
                  
-             print(f"  Pattern {h[:8]}... Freq: {frequency:.2%} ({count}/{global_total_units})")
-             # Print structure glimpse
-             example = pattern_examples[h]
-             names = [example.nodes[n].get('op_name' if mode=='comm' else 'name', '') for n in example.nodes]
-             print(f"    Nodes: {names}")
-             print(f"    Edges: {len(example.edges())}")
-             
-             # Visualize top 3 patterns
-             if i < 3:
-                 filename = f"rank{i+1}_freq{int(frequency*100)}pct.png"
-                 output_filename = os.path.join(k_out_path, filename)
-                 title = f"Pattern k={k} Rank {i+1} | Freq: {frequency:.1%} ({count}/{global_total_units})"
-                 try:
-                     if mode == 'comm':
-                         visualize_interaction_graph(example, output_filename, title=title)
-                     else:
-                         visualize_graph(example, output_filename, title=title)
-                     print(f"    Saved visualization to {output_filename}")
-                 except Exception as e:
-                     print(f"    Failed to visualize: {e}")
+                 # Visualize top 3 patterns
+                 if i < 3 and global_total_units > 0:
+                     ax = fig.add_subplot(n_rows, 3, (k - k_min) * 3 + i + 1)
+                     title = f"Pattern k={k} Rank {i+1} | Freq: {frequency:.1%} ({count}/{global_total_units})"
+                     try:
+                         if mode == 'comm':
+                             visualize_interaction_graph(example, title=title, ax=ax)
+                         else:
+                             visualize_graph(example, title=title, ax=ax)
+                     except Exception as e:
+                         print(f"    Failed to visualize: {e}")
+        
+        if fig.axes:
+            output_filename = os.path.join(base_out_path, "patterns_summary.png")
+            fig.savefig(output_filename, dpi=150, bbox_inches='tight')
+            print(f"Saved pattern visualizations to {output_filename}")
+
+    finally:
+        plt.close(fig)
+        pool.terminate()
+        pool.join()
+        _GRAPHS[:] = []
+        if graphs_path is not None:
+            os.remove(graphs_path)
+
+def _positive_int(value):
+    """argparse type for options that must be an integer >= 1."""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Mine frequent communication patterns in QASM circuits.")
@@ -426,9 +1050,12 @@ if __name__ == "__main__":
     parser.add_argument("--exact", action="store_true", help="Use exhaustive search instead of sampling")
     parser.add_argument("--mode", choices=['dataflow', 'comm'], default='dataflow', help="Mining mode: 'dataflow' or 'comm' (interaction flow)")
     parser.add_argument("--output-dir", type=str, default='results', help="Directory to save results")
+    parser.add_argument("--no-cache", action="store_true", help=f"Rebuild graphs instead of reusing cached ones from OUTPUT_DIR/{CACHE_SUBDIR}")
+    parser.add_argument("--max-subgraphs", type=_positive_int, default=None, help="With --exact: stop enumerating a graph after about this many subgraphs (whole ESU roots in random order; frequencies become estimates)")
+    parser.add_argument("--cnarw", action="store_true", help="Dataflow sampling: common-neighbor-aware expansion (faster pattern coverage, biased frequencies)")
     
     args = parser.parse_args()
     
     use_sampling = not args.exact
     
-    mine_patterns(args.inputs, min_support=0.5, k_min=args.k_min, k_max=args.k_max, num_samples=args.samples, use_sampling=use_sampling, mode=args.mode, output_dir=args.output_dir)
+    mine_patterns(args.inputs, min_support=0.5, k_min=args.k_min, k_max=args.k_max, num_samples=args.samples, use_sampling=use_sampling, mode=args.mode, output_dir=args.output_dir, use_cache=not args.no_cache, cnarw=args.cnarw, max_subgraphs=args.max_subgraphs)
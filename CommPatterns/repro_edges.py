@@ -1,5 +1,4 @@
 from qiskit import QuantumCircuit
-import networkx as nx
 from graph_builder import build_graph_from_circuit
 
 qc = QuantumCircuit(2)
@@ -10,10 +9,10 @@ qc.cx(0, 1) # Should come from previous cx(0,1) -> 2 incoming edges (both from n
 
 G = build_graph_from_circuit(qc)
 
-print("Nodes:", G.nodes(data=True))
-print("Edges:", G.edges(data=True))
+print("Nodes:", list(zip(G.node_indices(), G.nodes())))
+print("Edges:", G.weighted_edge_list())
 
-for n in G.nodes:
+for n in G.node_indices():
     in_degree = G.in_degree(n)
-    op_name = G.nodes[n]['name']
+    op_name = G[n].name
     print(f"Node {n} ({op_name}): in_degree={in_degree}")
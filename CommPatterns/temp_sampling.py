@@ -1,6 +1,6 @@
 def count_interaction_edges(G_sub):
     count = 0
-    for u, v, data in G_sub.edges(data=True):
+    for data in G_sub.edges():
         if data.get('type') == 'interaction':
             count += 1
     return count
@@ -14,7 +14,7 @@ def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
     
     # 1. Identify all interaction edges to start from
     interaction_edges = []
-    for u, v, data in G.edges(data=True):
+    for u, v, data in G.weighted_edge_list():
          if data.get('type') == 'interaction':
              interaction_edges.append((u, v))
              
@@ -27,7 +27,7 @@ def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
         curr_nodes = {start_u, start_v}
         
         # Check current count (should be >= 1)
-        sub = G.subgraph(curr_nodes)
+        sub = G.subgraph(list(curr_nodes))
         curr_k = count_interaction_edges(sub)
         
         if curr_k > k:
@@ -45,8 +45,8 @@ def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
             # Find neighbors
             neighbors = set()
             for n in curr_nodes:
-                neighbors.update(G.successors(n))
-                neighbors.update(G.predecessors(n))
+                neighbors.update(G.successor_indices(n))
+                neighbors.update(G.predecessor_indices(n))
             
             neighbors.difference_update(curr_nodes)
             
@@ -59,7 +59,7 @@ def sample_subgraphs_by_interaction_k(G, k, num_samples=2000):
             next_node = random.choice(list(neighbors))
             curr_nodes.add(next_node)
             
-            sub = G.subgraph(curr_nodes)
+            sub = G.subgraph(list(curr_nodes))
             curr_k = count_interaction_edges(sub)
             
             if curr_k == k:
@@ -0,0 +1,192 @@
+import itertools
+import random
+import unittest
+
+import networkx as nx
+import rustworkx as rx
+
+import pattern_miner
+
+
+class EsuBudgetTest(unittest.TestCase):
+    """esu_enumerate(max_subgraphs=...) stops after the root that reaches the budget."""
+
+    def setUp(self):
+        self.G = rx.generators.directed_grid_graph(30, 30)
+        self.numba = pattern_miner.numba
+
+    def tearDown(self):
+        pattern_miner.numba = self.numba
+
+    def _check_budget(self):
+        k = 4
+        roots = list(self.G.node_indices())
+        random.Random(0).shuffle(roots)
+        per_root = [sum(1 for _ in pattern_miner.esu_enumerate(self.G, k, [v])) for v in roots]
+        for budget in (1, 50, 1000):
+            found = sum(1 for _ in pattern_miner.esu_enumerate(self.G, k, roots, max_subgraphs=budget))
+            # The count is the first prefix of whole roots that reaches the budget
+            total = 0
+            for n in per_root:
+                total += n
+                if total >= budget:
+                    break
+            self.assertEqual(found, total)
+            self.assertLess(found - n, budget)
+        for budget in (0, -1):
+            with self.assertRaises(ValueError):
+                list(pattern_miner.esu_enumerate(self.G, k, roots, max_subgraphs=budget))
+
+    def test_budget_numba(self):
+        if self.numba is None:
+            self.skipTest("numba not installed")
+        self._check_budget()
+
+    def test_budget_python(self):
+        pattern_miner.numba = None
+        self._check_budget()
+
+    def test_no_budget_enumerates_everything(self):
+        full = list(pattern_miner.esu_enumerate(self.G, 3))
+        self.assertEqual(len(full), len(set(map(frozenset, full))))
+        budgeted = list(pattern_miner.esu_enumerate(self.G, 3, max_subgraphs=len(full) * 2))
+        self.assertEqual(len(budgeted), len(full))
+
+
+def _random_multigraph(rng):
+    """Small random PyDiGraph with parallel edges, self-loops and (often) several components."""
+    G = rx.PyDiGraph(multigraph=True)
+    n = rng.randint(1, 9)
+    G.add_nodes_from(range(n))
+    for _ in range(rng.randint(0, 2 * n)):
+        G.add_edge(rng.randrange(n), rng.randrange(n), None)
+    return G
+
+
+def _connected_subsets(G, k, roots):
+    """Brute force: every connected (ignoring direction) k-subset whose smallest node is in roots."""
+    found = set()
+    for nodes in itertools.combinations(G.node_indices(), k):
+        if nodes[0] in roots and rx.is_weakly_connected(G.subgraph(list(nodes))):
+            found.add(frozenset(nodes))
+    return found
+
+
+class EsuEnumerateTest(unittest.TestCase):
+    """esu_enumerate yields every connected induced k-subgraph exactly once, on both paths."""
+
+    def setUp(self):
+        self.numba = pattern_miner.numba
+
+    def tearDown(self):
+        pattern_miner.numba = self.numba
+
+    def _check_against_brute_force(self):
+        rng = random.Random(2)
+        for _ in range(150):
+            G = _random_multigraph(rng)
+            nodes = list(G.node_indices())
+            subset = rng.sample(nodes, rng.randint(1, len(nodes)))
+            for k in range(1, 5):
+                for roots in (None, subset):
+                    found = [frozenset(s) for s in pattern_miner.esu_enumerate(G, k, roots)]
+                    self.assertEqual(len(found), len(set(found)))
+                    expected = _connected_subsets(G, k, set(nodes if roots is None else roots))
+                    self.assertEqual(set(found), expected, (G.edge_list(), k, roots))
+
+    def test_numba(self):
+        if self.numba is None:
+            self.skipTest("numba not installed")
+        self._check_against_brute_force()
+
+    def test_python(self):
+        pattern_miner.numba = None
+        self._check_against_brute_force()
+
+
+def _random_structure(rng, mode):
+    """Random labelled structure (node_labels, edge_labels) as built by _labelled_structure."""
+    n = rng.randint(2, 5)
+    if mode == 'comm':
+        node_labels = [''] * n
+        tags = [('flow_',), ('interaction_cx',), ('flow_', 'interaction_cx')]
+    else:
+        node_labels = [rng.choice('ab') for _ in range(n)]
+        tags = [1, 2]
+    edge_labels = {(u, v): rng.choice(tags)
+                   for u in range(n) for v in range(n) if rng.random() < 0.35}
+    return node_labels, edge_labels
+
+
+def _relabel(structure, perm):
+    """The same structure with node i renamed to perm[i]."""
+    node_labels, edge_labels = structure
+    relabelled = [None] * len(node_labels)
+    for i, label in enumerate(node_labels):
+        relabelled[perm[i]] = label
+    return relabelled, {(perm[u], perm[v]): label for (u, v), label in edge_labels.items()}
+
+
+def _to_nx(structure):
+    node_labels, edge_labels = structure
+    g = nx.DiGraph()
+    for n, label in enumerate(node_labels):
+        g.add_node(n, label=label)
+    for (u, v), label in edge_labels.items():
+        g.add_edge(u, v, label=label)
+    return g
+
+
+class CanonLabelTest(unittest.TestCase):
+    """
+    Every canonical labelling backend gives two structures the same label exactly when
+    they are isomorphic (node and edge labels included), whatever the node numbering.
+    """
+
+    def setUp(self):
+        self.saved = (pattern_miner.MAX_CANON_PERMUTATIONS, pattern_miner.pynauty, pattern_miner.igraph)
+        pattern_miner._canon_label_cache.clear()
+
+    def tearDown(self):
+        pattern_miner.MAX_CANON_PERMUTATIONS, pattern_miner.pynauty, pattern_miner.igraph = self.saved
+        pattern_miner._canon_label_cache.clear()
+
+    def _check_backend(self, prefix, canon):
+        rng = random.Random(1)
+        for mode in ('dataflow', 'comm'):
+            pool = []
+            for _ in range(60):
+                structure = _random_structure(rng, mode)
+                pool.append(structure)
+                perm = list(range(len(structure[0])))
+                rng.shuffle(perm)
+                pool.append(_relabel(structure, perm))
+            
+            labels = [pattern_miner.canon_label(*structure, mode=mode) for structure in pool]
+            graphs = [_to_nx(structure) for structure in pool]
+            match = lambda a, b: a['label'] == b['label']
+            for i, j in itertools.combinations(range(len(pool)), 2):
+                isomorphic = nx.is_isomorphic(graphs[i], graphs[j], node_match=match, edge_match=match)
+                self.assertEqual(labels[i] == labels[j], isomorphic, (mode, pool[i], pool[j]))
+            # The backend under test is the one that produced the labels
+            self.assertEqual(labels[0], pattern_miner._digest((prefix, canon(*pool[0]))))
+
+    def test_exact(self):
+        self._check_backend('exact', pattern_miner._brute_force_canon)
+
+    def test_nauty(self):
+        if pattern_miner.pynauty is None:
+            self.skipTest("pynauty not installed")
+        pattern_miner.MAX_CANON_PERMUTATIONS = 0
+        self._check_backend('nauty', pattern_miner._nauty_canon)
+
+    def test_bliss(self):
+        if pattern_miner.igraph is None:
+            self.skipTest("igraph not installed")
+        pattern_miner.MAX_CANON_PERMUTATIONS = 0
+        pattern_miner.pynauty = None
+        self._check_backend('bliss', pattern_miner._bliss_canon)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,27 @@
 import networkx as nx
+import rustworkx as rx
 import matplotlib.pyplot as plt
+from graph_builder import to_networkx
 
-def visualize_graph(G: nx.MultiDiGraph, output_file: str = None, title: str = None):
+# Above this many edges, edges are drawn without arrowheads: networkx then renders them
+# as a single LineCollection instead of one FancyArrowPatch per edge
+ARROW_EDGE_LIMIT = 500
+
+def visualize_graph(G: rx.PyDiGraph, output_file: str = None, title: str = None, ax=None):
     """
     Visualizes the QASM dataflow graph using Matplotlib.
     
     Nodes are positioned based on:
     - X-axis: 'layer' attribute (topological depth/time)
     - Y-axis: 'avg_qubit' attribute (logical qubit index)
+    If ax is given, the graph is drawn into it and saving is left to the caller.
     """
-    plt.figure(figsize=(12, 8))
+    # NetworkX drawing helpers need a NetworkX graph
+    G = to_networkx(G)
+    own_figure = ax is None
+    if own_figure:
+        plt.figure(figsize=(12, 8))
+        ax = plt.gca()
     
     pos = {}
     for node, data in G.nodes(data=True):
@@ -18,41 +30,49 @@ def visualize_graph(G: nx.MultiDiGraph, output_file: str = None, title: str = No
         
     # Draw edges
     # User requested straight edges. Parallel edges will overlap visually.
-    nx.draw_networkx_edges(G, pos, edge_color='gray', arrows=True, alpha=0.5)
+    arrows = G.number_of_edges() <= ARROW_EDGE_LIMIT
+    nx.draw_networkx_edges(G, pos, edge_color='gray', arrows=arrows, alpha=0.5, ax=ax)
     
     # Draw nodes
     # Color nodes by type/name if desired, for now uniform
-    nx.draw_networkx_nodes(G, pos, node_size=500, node_color='lightblue', alpha=0.9)
+    nx.draw_networkx_nodes(G, pos, node_size=500, node_color='lightblue', alpha=0.9, ax=ax)
     
     # Labels
     labels = {n: G.nodes[n].get('name', '') for n in G.nodes}
-    nx.draw_networkx_labels(G, pos, labels=labels, font_size=8)
+    nx.draw_networkx_labels(G, pos, labels=labels, font_size=8, ax=ax)
     
     if title:
-        plt.title(title)
+        ax.set_title(title)
     else:
-        plt.title("Qubit Dataflow Graph")
-    plt.xlabel("Layer (Time)")
-    plt.ylabel("Qubit Index (inverted)")
+        ax.set_title("Qubit Dataflow Graph")
+    ax.set_xlabel("Layer (Time)")
+    ax.set_ylabel("Qubit Index (inverted)")
     
     # Remove ticks/spines for cleaner look
-    plt.axis('off')
+    ax.axis('off')
     
+    if not own_figure:
+        return
     if output_file:
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        plt.savefig(output_file, dpi=150, bbox_inches='tight')
         print(f"Graph visualization saved to {output_file}")
     else:
         plt.show()
     plt.close()
 
-def visualize_interaction_graph(G: nx.MultiDiGraph, output_file: str = None, title: str = None):
+def visualize_interaction_graph(G: rx.PyDiGraph, output_file: str = None, title: str = None, ax=None):
     """
     Visualizes the Interaction Flow Graph.
     Layout:
     - X axis: Layer (Time)
     - Y axis: Qubit Index
+    If ax is given, the graph is drawn into it and saving is left to the caller.
     """
-    plt.figure(figsize=(12, 8))
+    G = to_networkx(G)
+    own_figure = ax is None
+    if own_figure:
+        plt.figure(figsize=(12, 8))
+        ax = plt.gca()
     
     # Custom Layout based on layer and qubit_index
     pos = {}
@@ -63,15 +83,17 @@ def visualize_interaction_graph(G: nx.MultiDiGraph, output_file: str = None, tit
         
     # Draw Nodes
     # Color mapping? Maybe by Op Name?
-    nx.draw_networkx_nodes(G, pos, node_size=300, node_color='lightblue', alpha=0.9)
+    nx.draw_networkx_nodes(G, pos, node_size=300, node_color='lightblue', alpha=0.9, ax=ax)
     
     # Labels (Q0, Q1...)
     labels = nx.get_node_attributes(G, 'label')
-    nx.draw_networkx_labels(G, pos, labels=labels, font_size=8)
+    nx.draw_networkx_labels(G, pos, labels=labels, font_size=8, ax=ax)
     
     # Draw Edges types separately
     flow_edges = []
     interaction_edges = []
+    # Interaction edge labels are collected in the same pass over the edges
+    interaction_labels = {}
     
     for u, v, data in G.edges(data=True):
         edge_type = data.get('type', 'unknown')
@@ -79,37 +101,38 @@ def visualize_interaction_graph(G: nx.MultiDiGraph, output_file: str = None, tit
             flow_edges.append((u, v))
         else:
             interaction_edges.append((u, v))
+            if edge_type == 'interaction':
+                lbl = data.get('label', '')
+                if lbl:
+                    interaction_labels[(u,v)] = lbl
+            
+    arrows = G.number_of_edges() <= ARROW_EDGE_LIMIT
             
     # Draw Flow Edges (Horizontal, lighter)
     nx.draw_networkx_edges(G, pos, edgelist=flow_edges, 
-                           edge_color='gray', arrows=True, arrowstyle='->', alpha=0.5)
+                           edge_color='gray', arrows=arrows, arrowstyle='->' if arrows else None, alpha=0.5, ax=ax)
                            
     # Draw Interaction Edges (Vertical/Diagonal, distinct)
     # Use curvature for these if they are long range?
     # For now, straight or slightly curved.
     nx.draw_networkx_edges(G, pos, edgelist=interaction_edges, 
-                           edge_color='red', arrows=True, width=1.5, alpha=0.8)
+                           edge_color='red', arrows=arrows, width=1.5, alpha=0.8, ax=ax)
                            
     # Draw Interaction Edge Labels
-    interaction_labels = {}
-    for u, v, data in G.edges(data=True):
-        if data.get('type') == 'interaction':
-            lbl = data.get('label', '')
-            if lbl:
-                interaction_labels[(u,v)] = lbl
-                
     nx.draw_networkx_edge_labels(G, pos, edge_labels=interaction_labels, font_size=8, font_color='darkred',
-                                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', pad=1))
+                                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', pad=1), ax=ax)
                                    
     if title:
-        plt.title(title)
+        ax.set_title(title)
     else:
-        plt.title("Qubit Interaction Flow Graph")
+        ax.set_title("Qubit Interaction Flow Graph")
         
-    plt.axis('off')
+    ax.axis('off')
     
+    if not own_figure:
+        return
     if output_file:
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        plt.savefig(output_file, dpi=150, bbox_inches='tight')
         print(f"Interaction graph saved to {output_file}")
     else:
         plt.show()